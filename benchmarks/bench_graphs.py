@@ -0,0 +1,71 @@
+#
+# Define tasks depending on each other and execute them.
+#
+# Copyright (c) 2016 Richard Klees <richard.klees@rwth-aachen.de>
+#
+# This software is licensed under The MIT License. You should have
+# received a copy of the LICENSE with the code.
+#
+
+"""
+Benchmarks for the VM on the graphs in graphs.py. Use run.py to run them.
+
+The sizes are taken from TSK_BENCH_SIZES, e.g. "1000,10000". The VM needs
+quadratic time in the number of open goals, a deep chain of 10000 tasks
+already takes about 15 seconds per run. Besides the timings, every benchmark
+reports the throughput in tasks per second and the overhead per task as extra
+info. The peak memory of an additional traced run is reported for sizes up to
+TSK_BENCH_MEMORY_SIZE only, as tracing slows down the run a lot.
+"""
+
+import os
+import tracemalloc
+
+import pytest
+
+from graphs import GRAPHS
+
+
+SIZES = [int(s) for s in os.environ.get("TSK_BENCH_SIZES", "1000").split(",")]
+ROUNDS = int(os.environ.get("TSK_BENCH_ROUNDS", "3"))
+MEMORY_SIZE = int(os.environ.get("TSK_BENCH_MEMORY_SIZE", "1000"))
+
+_log = []
+
+def collect(msg):
+    _log.append(msg)
+
+LOGGERS = {"no_log" : None, "log" : collect}
+
+
+def peak_memory(graph, size, log):
+    tc, _ = graph(size)
+    tracemalloc.start()
+    try:
+        tc.run(log = log)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+        del _log[:]
+
+@pytest.mark.parametrize("logger", sorted(LOGGERS))
+@pytest.mark.parametrize("size", SIZES)
+@pytest.mark.parametrize("graph", GRAPHS, ids = [g.__name__ for g in GRAPHS])
+def test_graph(benchmark, graph, size, logger):
+    log = LOGGERS[logger]
+
+    def setup():
+        del _log[:]
+        tc, _ = graph(size)
+        return (tc,), {"log" : log}
+
+    benchmark.pedantic(lambda tc, log: tc.run(log = log), setup = setup,
+                       rounds = ROUNDS, warmup_rounds = 1)
+
+    _, tasks = graph(size)
+    mean = benchmark.stats.stats.mean
+    benchmark.extra_info["tasks"] = tasks
+    benchmark.extra_info["tasks_per_sec"] = tasks / mean
+    benchmark.extra_info["sec_per_task"] = mean / tasks
+    if size <= MEMORY_SIZE:
+        benchmark.extra_info["peak_memory"] = peak_memory(graph, size, log)
@@ -0,0 +1,66 @@
+#
+# Define tasks depending on each other and execute them.
+#
+# Copyright (c) 2016 Richard Klees <richard.klees@rwth-aachen.de>
+#
+# This software is licensed under The MIT License. You should have
+# received a copy of the LICENSE with the code.
+#
+
+"""
+Guards for the cost of import tsk, based on python -X importtime.
+
+Every new subsystem should be loaded lazily, so import tsk must not import
+any module besides tsk itself. The budget for the import in microseconds is
+taken from TSK_IMPORT_BUDGET_US.
+"""
+
+import os
+import subprocess
+import sys
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET_US = int(os.environ.get("TSK_IMPORT_BUDGET_US", "1000"))
+RUNS = 5
+
+def import_times(code):
+    """
+    Run the code in a fresh interpreter and return a dict of the imported
+    modules and their cumulative import times in microseconds.
+    """
+    # Compiling the sources would dominate, so make sure the bytecode of
+    # tsk gets cached like for an installed package.
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    proc = subprocess.Popen([sys.executable, "-X", "importtime", "-c", code],
+                            cwd = ROOT, env = env, stderr = subprocess.PIPE,
+                            universal_newlines = True)
+    _, err = proc.communicate()
+    assert proc.returncode == 0, err
+
+    times = {}
+    for line in err.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+def test_import_loads_nothing_else():
+    before = import_times("pass")
+    after = import_times("import tsk")
+
+    assert sorted(set(after) - set(before)) == ["tsk"]
+
+def test_import_time():
+    best = min(import_times("import tsk")["tsk"] for _ in range(RUNS))
+
+    assert best <= BUDGET_US, "import tsk took %dus" % best
+
+def test_lazy_exports_work():
+    import_times("import sys, tsk\n"
+                 "assert not 'tsk.tsk' in sys.modules\n"
+                 "from tsk import *\n"
+                 "assert task.__module__ == 'tsk.tsk'\n"
+                 "assert tsk.tsk.ConsoleLogger\n")
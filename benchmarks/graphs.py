@@ -0,0 +1,111 @@
+#
+# Define tasks depending on each other and execute them.
+#
+# Copyright (c) 2016 Richard Klees <richard.klees@rwth-aachen.de>
+#
+# This software is licensed under The MIT License. You should have
+# received a copy of the LICENSE with the code.
+#
+
+"""
+Synthetic task graphs for the benchmarks.
+
+Every graph is a function that takes a size and returns the task call to run
+and the number of task calls the VM has to deal with for it. That includes
+the task calls that only reuse a known result, so the number is roughly the
+size for every graph.
+"""
+
+from tsk.tsk import task
+
+
+@task
+def leaf(i):
+    yield i
+
+@task
+def chain_link(n):
+    if n > 0:
+        yield chain_link(n - 1)
+    yield n
+
+def deep_chain(size):
+    """ Every task requires the next one. """
+    return chain_link(size - 1), size
+
+
+@task
+def fan_out_root(n):
+    res = yield tuple(leaf(i) for i in range(n))
+    yield len(res)
+
+def fan_out(size):
+    """ One task requires all others at once. """
+    return fan_out_root(size - 1), size
+
+
+@task
+def fan_in_middle(i):
+    shared = yield leaf(-1)
+    yield shared + i
+
+@task
+def fan_in_root(n):
+    res = yield tuple(fan_in_middle(i) for i in range(n))
+    yield len(res)
+
+def fan_in(size):
+    """ Many tasks require one single task. """
+    n = max((size - 1) // 2, 1)
+    return fan_in_root(n), 2 * n + 1
+
+
+@task
+def diamond_top(level):
+    if level > 0:
+        yield (diamond_side(level, "left"), diamond_side(level, "right"))
+    yield level
+
+@task
+def diamond_side(level, side):
+    yield diamond_top(level - 1)
+    yield level
+
+def diamonds(size):
+    """ Diamonds stacked upon each other. """
+    levels = max((size - 1) // 4, 1)
+    return diamond_top(levels), 4 * levels + 1
+
+
+@task
+def reuse_root(n, distinct):
+    total = 0
+    for i in range(n):
+        total += yield leaf(i % distinct)
+    yield total
+
+def reuse(size):
+    """ Few tasks whose results are used over and over again. """
+    n = max(size - 1, 1)
+    return reuse_root(n, max(n // 100, 1)), n + 1
+
+
+@task
+def make_index(n):
+    for p in range(n):
+        yield make_page(p, n)
+    yield "index.html"
+
+@task
+def make_page(page, n):
+    # Like in the README, the result is known early to break the cycle.
+    yield "pages/%d.html" % page
+    yield make_index(n)
+
+def early_result_cycle(size):
+    """ Pages and an index that require each other. """
+    n = max((size - 1) // 2, 1)
+    return make_page(0, n), 2 * n + 1
+
+
+GRAPHS = [deep_chain, fan_out, fan_in, diamonds, reuse, early_result_cycle]
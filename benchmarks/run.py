@@ -0,0 +1,89 @@
+#
+# Define tasks depending on each other and execute them.
+#
+# Copyright (c) 2016 Richard Klees <richard.klees@rwth-aachen.de>
+#
+# This software is licensed under The MIT License. You should have
+# received a copy of the LICENSE with the code.
+#
+
+"""
+Run the benchmarks and compare them against a saved baseline.
+
+    python benchmarks/run.py --save baseline
+    ... change things ...
+    python benchmarks/run.py --compare baseline
+
+NAME is the name the results were saved under, or the number of the run.
+The comparison fails if the mean time of a benchmark got slower than the
+threshold. This needs pytest-benchmark, the results are stored in
+.benchmarks.
+"""
+
+import argparse
+import glob
+import os
+import subprocess
+import sys
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The VM needs quadratic time in the number of open goals, larger graphs
+# won't finish in reasonable time.
+MAX_SIZE = 10000
+STORAGE = os.path.join(ROOT, ".benchmarks")
+
+def run_id(name):
+    """
+    Get the number of the latest run saved under the name, pytest-benchmark
+    only compares against numbers.
+    """
+    if name.isdigit():
+        return name
+    paths = sorted(glob.glob(os.path.join(STORAGE, "*", "*_%s.json" % name)))
+    if len(paths) == 0:
+        raise SystemExit("There are no saved results named %r." % name)
+    return os.path.basename(paths[-1]).split("_", 1)[0]
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Run the tsk benchmarks.")
+    parser.add_argument("--sizes", default = "1000",
+        help = "comma separated sizes of the graphs, at most %d, e.g. "
+               "1000,10000" % MAX_SIZE)
+    parser.add_argument("--rounds", default = 3, type = int,
+        help = "how often every benchmark is run")
+    parser.add_argument("--save", metavar = "NAME",
+        help = "save the results under this name")
+    parser.add_argument("--compare", metavar = "NAME", nargs = "?", const = "",
+        help = "compare against the results saved under this name or number "
+               "(the latest by default)")
+    parser.add_argument("--threshold", default = "10%",
+        help = "how much slower the mean may get when comparing")
+    parser.add_argument("pytest_args", nargs = "*",
+        help = "further arguments for pytest, e.g. -k deep_chain")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    if max(sizes) > MAX_SIZE:
+        parser.error("sizes above %d won't finish in reasonable time"
+                     % MAX_SIZE)
+
+    cmd = [ sys.executable, "-m", "pytest", "benchmarks"
+          , "-o", "python_files=bench_*.py"
+          , "--benchmark-columns=min,mean,max,stddev,rounds"
+          ]
+    if args.save:
+        cmd.append("--benchmark-save=%s" % args.save)
+    if args.compare is not None:
+        cmd.append("--benchmark-compare=%s" % run_id(args.compare)
+                   if args.compare else "--benchmark-compare")
+        cmd.append("--benchmark-compare-fail=mean:%s" % args.threshold)
+    cmd.extend(args.pytest_args)
+
+    env = dict(os.environ, TSK_BENCH_SIZES = args.sizes,
+               TSK_BENCH_ROUNDS = str(args.rounds))
+    return subprocess.call(cmd, cwd = ROOT, env = env)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,6 +7,7 @@
 # received a copy of the LICENSE with the code.
 #
 
+import time
 from nose.tools import with_setup
 from tsk.tsk import *
 
@@ -381,3 +382,385 @@ def test_with_log_task_reuse_result():
     assert l4.args == ()
     assert [t.task.__name__ for t in l4.dependents] == []
 
+
+@task
+def make_error():
+    log("error")
+    raise ValueError("error")
+    yield "error"
+
+@task
+def make_foo_error():
+    foo = yield make_foo()
+    error = yield make_error()
+    yield foo + error
+
+@with_setup(setup_function)
+def test_error_with_context():
+    try:
+        make_foo_error().run()
+        assert False
+    except TaskFailedError as e:
+        assert e.task_call == make_error()
+        assert e.dependency_chain == [make_foo_error()]
+        assert isinstance(e.error, ValueError)
+
+@task
+def make_cleanup():
+    try:
+        yield make_error()
+    finally:
+        log("cleanup")
+
+@with_setup(setup_function)
+def test_cancel_on_error():
+    _log = []
+
+    try:
+        make_cleanup().run(log = lambda msg: _log.append(msg))
+        assert False
+    except TaskFailedError:
+        pass
+
+    assert log() == ["error", "cleanup"]
+
+    assert isinstance(_log[2], FailedTask)
+    assert _log[2].task.__name__ == "make_error"
+    assert isinstance(_log[2].error, ValueError)
+    assert isinstance(_log[3], CancelledTask)
+    assert _log[3].task.__name__ == "make_cleanup"
+
+@task
+def make_error_and_123():
+    error, num = yield (make_foo_error(), make_123())
+    yield error + num
+
+@task
+def make_error_num(num):
+    raise ValueError(num)
+    yield num
+
+@task
+def make_two_errors():
+    e1, foo, e2 = yield (make_error_num(1), make_foo(), make_error_num(2))
+    yield foo
+
+@with_setup(setup_function)
+def test_keep_going():
+    try:
+        make_error_and_123().run(keep_going = True)
+        assert False
+    except FailedTasksError as e:
+        assert len(e.failures) == 1
+        assert e.failures[0].task_call == make_error()
+        assert e.failures[0].dependency_chain[-1] == make_foo_error()
+
+    assert log() == ["foo", "error", 1, 2, 3]
+
+@with_setup(setup_function)
+def test_keep_going_reports_all():
+    try:
+        make_two_errors().run(keep_going = True)
+        assert False
+    except FailedTasksError as e:
+        assert ([f.task_call for f in e.failures]
+                == [make_error_num(1), make_error_num(2)])
+
+    assert log() == ["foo"]
+
+@with_setup(setup_function)
+def test_keep_going_without_errors():
+    res = make_foobar().run(keep_going = True)
+
+    assert res == "foobar"
+
+@task
+def make_sleep():
+    time.sleep(0.05)
+    log("sleep")
+    yield "sleep"
+
+@task(timeout = 0.01)
+def make_slow():
+    log("slow")
+    sleep = yield make_sleep()
+    log("too late")
+    yield sleep
+
+@with_setup(setup_function)
+def test_timeout():
+    try:
+        make_slow().run()
+        assert False
+    except TaskFailedError as e:
+        assert isinstance(e.error, TaskTimeoutError)
+
+    assert log() == ["slow", "sleep"]
+
+@with_setup(setup_function)
+def test_props_with_options():
+    assert make_slow.__name__ == "make_slow"
+    assert make_slow.timeout == 0.01
+
+_flaky = [0]
+
+@task(retry = RetryPolicy(attempts = 3, backoff = 0, jitter = 0))
+def make_flaky(fails):
+    foo = yield make_foo()
+    _flaky[0] += 1
+    log("flaky")
+    if _flaky[0] <= fails:
+        raise IOError("flaky")
+    bar = yield make_bar()
+    yield foo + bar
+
+@with_setup(setup_function)
+def test_retry():
+    _flaky[0] = 0
+    _log = []
+
+    res = make_flaky(2).run(log = lambda msg: _log.append(msg))
+
+    assert res == "foobar"
+    assert log() == ["foo", "flaky", "flaky", "flaky", "bar"]
+
+    retries = [l for l in _log if isinstance(l, RetryTask)]
+    assert [r.attempt for r in retries] == [1, 2]
+    assert [r.delay for r in retries] == [0, 0]
+    assert all(isinstance(r.error, IOError) for r in retries)
+
+@with_setup(setup_function)
+def test_retry_gives_up():
+    _flaky[0] = 0
+
+    try:
+        make_flaky(3).run()
+        assert False
+    except TaskFailedError as e:
+        assert isinstance(e.error, IOError)
+
+    assert log() == ["foo", "flaky", "flaky", "flaky"]
+
+@task(retry = RetryPolicy(backoff = 0, jitter = 0, exceptions = (IOError,)))
+def make_error_no_retry():
+    log("error")
+    raise ValueError("error")
+    yield "error"
+
+@with_setup(setup_function)
+def test_retry_only_some_errors():
+    try:
+        make_error_no_retry().run()
+        assert False
+    except TaskFailedError as e:
+        assert isinstance(e.error, ValueError)
+
+    assert log() == ["error"]
+
+@with_setup(setup_function)
+def test_retry_policy_delay():
+    policy = RetryPolicy(backoff = 1, factor = 2, jitter = 0.5)
+
+    assert 1 <= policy.delay(1) <= 1.5
+    assert 4 <= policy.delay(3) <= 4.5
+
+@task(cache = True)
+def make_cached(num):
+    log(num)
+    yield num
+
+@task
+def make_cached_12():
+    v1 = yield make_cached(1)
+    v2 = yield make_cached(2)
+    yield v1 + v2
+
+@with_setup(setup_function)
+def test_cache_across_runs():
+    make_cached.cache.clear()
+
+    res1 = make_cached_12().run()
+    res2 = make_cached_12().run()
+
+    assert res1 == 3
+    assert res2 == 3
+    assert log() == [1, 2]
+    assert make_cached.cache.hits == 2
+    assert make_cached.cache.misses == 2
+
+@task(cache = Cache(key = lambda path, log: path.rstrip("/")))
+def make_path(path, log):
+    log(path)
+    yield path
+
+@task
+def make_paths():
+    p1 = yield make_path("foo/", log)
+    p2 = yield make_path("foo", log)
+    yield p1 + p2
+
+@with_setup(setup_function)
+def test_cache_key():
+    make_path.cache.clear()
+
+    res = make_paths().run()
+
+    assert res == "foo/foo/"
+    assert log() == ["foo/"]
+
+@task(cache = Cache(max_entries = 2))
+def make_lru(num):
+    log(num)
+    yield num
+
+@task
+def make_lru_1231():
+    v = yield make_lru(1)
+    v = yield make_lru(2)
+    v = yield make_lru(3)
+    yield v
+
+@with_setup(setup_function)
+def test_cache_max_entries():
+    make_lru_1231().run()
+    make_lru(1).run()
+    make_lru(3).run()
+
+    assert log() == [1, 2, 3, 1]
+    assert make_lru.cache.evictions == 2
+    assert len(make_lru.cache) == 2
+
+@task(cache = Cache(ttl = 0))
+def make_expiring():
+    log("expiring")
+    yield "expiring"
+
+@with_setup(setup_function)
+def test_cache_ttl():
+    make_expiring().run()
+    make_expiring().run()
+
+    assert log() == ["expiring", "expiring"]
+    assert make_expiring.cache.hits == 0
+    assert make_expiring.cache.evictions == 1
+
+@task
+def make_error_a():
+    error = yield make_error()
+    yield error
+
+@task
+def make_error_b():
+    error = yield make_error()
+    yield error
+
+@task
+def make_error_ab():
+    a, b = yield (make_error_a(), make_error_b())
+    yield a + b
+
+@with_setup(setup_function)
+def test_error_dependency_chain():
+    try:
+        make_error_ab().run()
+        assert False
+    except TaskFailedError as e:
+        assert e.dependency_chain == [make_error_ab(), make_error_a()]
+
+@task(timeout = 0.01)
+def make_sleep_after_result():
+    yield "sleep"
+    time.sleep(0.05)
+    foo = yield make_foo()
+    log("after")
+
+@task
+def make_sleep_after_result_used():
+    sleep = yield make_sleep_after_result()
+    yield sleep
+
+@with_setup(setup_function)
+def test_no_timeout_after_result():
+    res = make_sleep_after_result_used().run()
+
+    assert res == "sleep"
+    assert log() == ["foo", "after"]
+
+@with_setup(setup_function)
+def test_retry_true():
+    @task(retry = True)
+    def make_retry_true():
+        yield "foo"
+
+    assert make_retry_true.retry.attempts == RetryPolicy().attempts
+
+@with_setup(setup_function)
+def test_retry_state_is_dropped():
+    _flaky[0] = 0
+    vm = VM(make_flaky(1), None)
+
+    assert vm.result() == "foobar"
+    assert vm.received == {}
+    assert vm.started == {}
+    assert vm.attempts == {}
+
+@task(cache = True)
+def make_cached_error():
+    log("cached_error")
+    yield "cached_error"
+    raise ValueError("error")
+
+@with_setup(setup_function)
+def test_no_cache_on_error():
+    for _ in range(2):
+        try:
+            make_cached_error().run()
+            assert False
+        except TaskFailedError:
+            pass
+
+    assert log() == ["cached_error", "cached_error"]
+    assert len(make_cached_error.cache) == 0
+
+@task(cache = True, timeout = 5)
+def make_cached_with_timeout():
+    log("cached_with_timeout")
+    yield 1
+
+@task
+def make_cached_with_timeout_used():
+    res = yield make_cached_with_timeout()
+    yield res
+
+@with_setup(setup_function)
+def test_cache_with_timeout():
+    make_cached_with_timeout.cache.clear()
+
+    res1 = make_cached_with_timeout_used().run()
+    res2 = make_cached_with_timeout_used().run()
+
+    assert res1 == 1
+    assert res2 == 1
+    assert log() == ["cached_with_timeout"]
+
+@task(cache = Cache(key = lambda num: num["num"]))
+def make_bad_key(num):
+    log(num)
+    yield num
+
+@task
+def make_bad_key_used():
+    num = yield make_bad_key(1)
+    yield num
+
+@with_setup(setup_function)
+def test_cache_key_error():
+    try:
+        make_bad_key_used().run()
+        assert False
+    except TaskFailedError as e:
+        assert e.task_call == make_bad_key(1)
+        assert e.dependency_chain == [make_bad_key_used()]
+        assert isinstance(e.error, TypeError)
+
+    assert log() == []
@@ -7,6 +7,42 @@
 # received a copy of the LICENSE with the code.
 #
 
-from .tsk import task
+import sys
 
-__all__ = ["task"]
+__all__ = [ "task", "RetryPolicy", "Cache"
+          , "TaskFailedError", "FailedTasksError", "TaskTimeoutError"
+          ]
+
+# Importing tsk should be cheap, so the engine is only loaded when one of
+# its names is used. Put new exports here as name -> module in this package.
+_lazy = { "task" : "tsk"
+        , "RetryPolicy" : "tsk"
+        , "Cache" : "tsk"
+        , "TaskFailedError" : "tsk"
+        , "FailedTasksError" : "tsk"
+        , "TaskTimeoutError" : "tsk"
+        }
+
+if sys.version_info >= (3, 7):
+    def __getattr__(name):
+        from importlib import import_module
+        if not name in _lazy:
+            # Submodules like tsk.tsk are available as before.
+            try:
+                return import_module("." + name, __name__)
+            except ModuleNotFoundError as e:
+                # Only if the submodule itself is missing, errors from
+                # inside of it should show up as they are.
+                if e.name != __name__ + "." + name:
+                    raise
+                raise AttributeError("module %r has no attribute %r"
+                                     % (__name__, name))
+        value = getattr(import_module("." + _lazy[name], __name__), name)
+        globals()[name] = value
+        return value
+
+    def __dir__():
+        return sorted(set(globals()) | set(_lazy))
+else:
+    from .tsk import (task, RetryPolicy, Cache, TaskFailedError,
+                      FailedTasksError, TaskTimeoutError)
@@ -8,8 +8,12 @@
 #
 
 import functools
+import random
+import time
 import types
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
+
+_clock = getattr(time, "monotonic", time.time)
 
 
 # BASIC INTERFACE
@@ -17,9 +21,38 @@ from collections import namedtuple
 class task(object):
     """
     Turn an ordinary generator of tasks to a task.
+
+    Use it plain as @task or with options like @task(timeout = 10). The
+    timeout is given in seconds of wall clock time since the task was
+    started. It is checked whenever the task is about to go on, so a task
+    that blocks won't be interrupted, but won't go on after it returns.
+
+    Pass a RetryPolicy (or just a number of attempts, or True for the
+    default policy) as retry to run a task again if it fails. The results
+    it already received are handed to the new run, so the tasks it required
+    won't run again.
+
+    Pass a Cache (or True for one without limits) as cache to keep the
+    results of the task beyond a single run.
     """
-    def __init__(self, fun):
+    def __new__(cls, fun = None, **options):
+        if fun is None:
+            return lambda fun: cls(fun, **options)
+        return super(task, cls).__new__(cls)
+
+    def __init__(self, fun, timeout = None, retry = None, cache = None):
         self.fun = fun
+        self.timeout = timeout
+        if retry is True:
+            retry = RetryPolicy()
+        elif retry is False:
+            retry = None
+        elif isinstance(retry, int):
+            retry = RetryPolicy(attempts = retry)
+        self.retry = retry
+        if cache is True:
+            cache = Cache()
+        self.cache = cache
 
         functools.update_wrapper(self, fun)
 
@@ -39,14 +72,19 @@ class TaskCall(object):
         tup = namedtuple("Kwargs", kwargs.keys())
         self.kwargs = tup(**kwargs)
 
-    def run(self, log = None):
+    def run(self, log = None, keep_going = False):
         """
         Run this task.
 
         You may provide a logger function that retreives LoggerEntries during
         execution.
+
+        If a task raises, all tasks that are still running are cancelled and
+        a TaskFailedError is raised. With keep_going, only the tasks that
+        depend on the failed task are cancelled, all other work is finished
+        and a FailedTasksError with all failures is raised afterwards.
         """
-        vm = VM(self, log)
+        vm = VM(self, log, keep_going)
         return vm.result()
 
     def __hash__(self):
@@ -64,6 +102,94 @@ class TaskCall(object):
     def __repr__(self):
         return "<call to task %s at %s>" % (self.task.__repr__(), hex(id(self)))
 
+class RetryPolicy(object):
+    """
+    Tells how often a task is tried and how long to wait in between.
+
+    Before the n-th retry the VM waits backoff * factor ** (n - 1) seconds
+    plus a random amount of up to jitter seconds. Only errors that are
+    instances of exceptions are retried. The timeout of a task starts over
+    on every attempt.
+    """
+    def __init__(self, attempts = 3, backoff = 0.1, factor = 2.0, jitter = 0.1,
+                 exceptions = (Exception,)):
+        self.attempts = attempts
+        self.backoff = backoff
+        self.factor = factor
+        self.jitter = jitter
+        self.exceptions = exceptions
+
+    def retries(self, attempt, error):
+        """ Should we try again after the attempt failed with the error? """
+        return attempt < self.attempts and isinstance(error, self.exceptions)
+
+    def delay(self, attempt):
+        """ The seconds to wait after the attempt failed. """
+        return (self.backoff * self.factor ** (attempt - 1)
+                + random.uniform(0, self.jitter))
+
+class Cache(object):
+    """
+    Keeps the results of a task, also across runs.
+
+    Results are dropped after ttl seconds and the least recently used
+    results are dropped if there are more than max_entries. The key function
+    is called with the arguments of a task call and tells which calls share
+    a result, by default these are the calls with equal arguments. The
+    result of a task is cached once the task completed without errors.
+
+    hits, misses and evictions count how the cache was used, evictions
+    include the results dropped because of the ttl.
+    """
+    def __init__(self, ttl = None, max_entries = None, key = None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.key = key
+
+        self.entries = OrderedDict()    # key -> (time of storage, result)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key_for(self, tc):
+        kwargs = tc.kwargs._asdict()
+        if self.key is None:
+            return (tc.task, tc.args, tuple(sorted(kwargs.items())))
+        return (tc.task, self.key(*tc.args, **kwargs))
+
+    def get(self, tc):
+        """
+        Returns a tuple of a flag whether there is a result for the task call
+        and the result.
+        """
+        key = self.key_for(tc)
+        if key in self.entries:
+            entry = self.entries.pop(key)
+            if self.ttl is None or _clock() - entry[0] < self.ttl:
+                self.entries[key] = entry
+                self.hits += 1
+                return True, entry[1]
+            self.evictions += 1
+
+        self.misses += 1
+        return False, None
+
+    def put(self, tc, result):
+        key = self.key_for(tc)
+        self.entries.pop(key, None)
+        self.entries[key] = (_clock(), result)
+
+        while (self.max_entries is not None
+                and len(self.entries) > self.max_entries):
+            self.entries.popitem(last = False)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
 
 # ERRORS
 
@@ -79,6 +205,40 @@ class DoubleResultError(TaskError):
     """ A task announced two results. """
     pass
 
+class TaskTimeoutError(TaskError):
+    """ A task did not finish in the time it was given. """
+    pass
+
+class TaskFailedError(TaskError):
+    """
+    A task raised an error.
+
+    The original error is in error, the task call that raised it in task_call
+    and the task calls that depend on it in dependency_chain.
+    """
+    def __init__(self, task_call, dependency_chain, error):
+        self.task_call = task_call
+        self.dependency_chain = dependency_chain
+        self.error = error
+        self.__cause__ = error
+
+        chain = "".join("\n    required by %s" % d.task.__name__
+                        for d in reversed(dependency_chain))
+        super(TaskFailedError, self).__init__("%s failed: %r%s"
+            % (task_call.task.__name__, error, chain))
+
+class FailedTasksError(TaskError):
+    """
+    Some tasks raised errors while running with keep_going.
+
+    The single TaskFailedErrors are in failures.
+    """
+    def __init__(self, failures):
+        self.failures = failures
+
+        super(FailedTasksError, self).__init__("%d tasks failed:\n%s"
+            % (len(failures), "\n".join(str(f) for f in failures)))
+
 
 # LOGGING
 
@@ -94,6 +254,8 @@ class ConsoleLogger(object):
     error_color = "red"
     completed_color = "green"
     use_result_color = "blue"
+    cancelled_color = "yellow"
+    retry_color = "magenta"
     indentation = "    "
 
     def __init__(self, pr = None):
@@ -117,37 +279,60 @@ class ConsoleLogger(object):
         if self.first_task_call is None:
             self.first_task_call = msg.task_call
 
-        # We need to know the last entry to be able to print it later on.
-        if self.last is None:
-            self.last = msg
-            return
-
         # We need to know some facts about the last and the current task to
         # be able to react correctly and get the indentation right.
+        # Failed and cancelled tasks end like completed ones.
+        finishing = (CompletedTask, FailedTask, CancelledTask)
         last_entered = isinstance(self.last, EnteredTask)
-        last_completed = isinstance(self.last, CompletedTask)
-        cur_completed = isinstance(msg, CompletedTask)
+        cur_completed = isinstance(msg, finishing)
+        first_completed = (cur_completed
+                           and self.first_task_call == msg.task_call)
+
+        # Retries belong to the task that is running, so we print them right
+        # away on the level of that task, after everything before.
+        if isinstance(msg, RetryTask):
+            self.print_last()
+            self.level -= 1
+            self.print_msg(msg)
+            self.level += 1
+            return
+
+        # We need to know the last entry to be able to print it later on.
+        if self.last is None:
+            if first_completed:
+                self.level -= 1
+                self.print_msg(msg)
+            else:
+                self.last = msg
+            return
 
         # this happens when a task doe not invoke subtasks
         if last_entered and cur_completed and self.last.task_call == msg.task_call:
             self.print_msg(msg)
             self.last = None
         else:
-            if last_completed:
-                self.level -= 1
-
-            self.print_msg(self.last)
-
-            if last_entered:
-                self.level += 1
-
+            self.print_last()
             self.last = msg
 
         # this happens when the first task completes
-        if cur_completed and self.first_task_call == msg.task_call:
+        if first_completed:
             self.level -= 1
             self.print_msg(msg)
 
+    def print_last(self):
+        if self.last is None:
+            return
+
+        if isinstance(self.last, (CompletedTask, FailedTask, CancelledTask)):
+            self.level -= 1
+
+        self.print_msg(self.last)
+
+        if isinstance(self.last, EnteredTask):
+            self.level += 1
+
+        self.last = None
+
     def print_msg(self, msg):
         if isinstance(msg, EnteredTask):
             color = self.entered_color
@@ -155,8 +340,12 @@ class ConsoleLogger(object):
             color = self.completed_color
         elif isinstance(msg, UseResultOfTask):
             color = self.use_result_color
-        #elif isinstance(msg, EnteredTask):
-        #    color = self.entered_color
+        elif isinstance(msg, FailedTask):
+            color = self.error_color
+        elif isinstance(msg, CancelledTask):
+            color = self.cancelled_color
+        elif isinstance(msg, RetryTask):
+            color = self.retry_color
         else:
             raise RuntimeError("Unknown message: %s" % msg)
 
@@ -166,7 +355,13 @@ class ConsoleLogger(object):
         self.pr(self.colored(ind + txt, color))
 
     def format_msg(self, msg):
-        return msg.task.__name__
+        name = msg.task.__name__
+        if isinstance(msg, RetryTask):
+            return ("%s failed with %r, attempt %d, retry in %.2fs"
+                    % (name, msg.error, msg.attempt, msg.delay))
+        if isinstance(msg, FailedTask):
+            return "%s failed with %r" % (name, msg.error)
+        return name
 
 
 class LogEntry(object):
@@ -204,6 +399,24 @@ class UseResultOfTask(LogEntry):
     """ The result of a task was reused. """
     pass
 
+class FailedTask(LogEntry):
+    """ A task raised the error. """
+    def __init__(self, task_call, dependency_chain, error):
+        super(FailedTask, self).__init__(task_call, dependency_chain)
+        self.error = error
+
+class CancelledTask(LogEntry):
+    """ A task was cancelled because another task failed. """
+    pass
+
+class RetryTask(LogEntry):
+    """ A task failed and will be tried again after waiting delay seconds. """
+    def __init__(self, task_call, dependency_chain, error, attempt, delay):
+        super(RetryTask, self).__init__(task_call, dependency_chain)
+        self.error = error
+        self.attempt = attempt
+        self.delay = delay
+
 
 # EXECUTION
 
@@ -211,9 +424,10 @@ class VM(object):
     """
     This is the machine that runs the tasks and manages the results.
     """
-    def __init__(self, tc, log):
+    def __init__(self, tc, log, keep_going = False):
         self.tc = tc
         self.log = (lambda x: None) if log is None else log
+        self.keep_going = keep_going
 
         self.results = {}       # results that are already known
         self.states = {}        # current states of task calls
@@ -221,6 +435,13 @@ class VM(object):
         self.goals = [self.tc]  # we start with one single goal and stack
                                 # futures goals above
         self.last_goal = None   # holds the last goal we accomplished (for logging)
+        self.started = {}       # when task calls with a timeout were started
+        self.failed = set()     # task calls that failed or were cancelled
+        self.failures = []      # errors of failed tasks when we keep going
+        self.received = {}      # results task calls with a retry policy
+                                # received so far
+        self.attempts = {}      # current attempt of retried task calls
+        self.cached = set()     # task calls that got their result from a cache
 
     def result(self):
         made_progress = True
@@ -234,19 +455,41 @@ class VM(object):
             if not made_progress:
                 raise LoopError()
 
+            # This happens when we kept going but the first task failed
+            if len(self.goals) == 0:
+                raise FailedTasksError(self.failures)
+
             # This is what we want to achieve next
             next_goal = self.goals[-1]
 
             # This is when all work is done
             if finished_last_goal:
                 self.log(CompletedTask(self.tc, []))
+                if len(self.failures) > 0:
+                    raise FailedTasksError(self.failures)
                 return self.results[next_goal]
 
-            state = self.get_state(next_goal)
             requires = self.get_requires(next_goal)
+
+            # We can't advance if a task we require failed
+            if any((self.is_failed(r) for r in requires)):
+                self.cancel(next_goal)
+                made_progress = True
+                continue
+
+            # Starting a task might fail as well, e.g. in the key function
+            # of its cache.
+            try:
+                state = self.get_state(next_goal)
+            except Exception as e:
+                self.fail(next_goal, e)
+                made_progress = True
+                continue
+
             results = self.get_results_for(requires)
 
             try:
+                self.check_timeout(next_goal)
                 res = state.send(results)
             except StopIteration:
                  # We might have finished the last goal ...
@@ -256,12 +499,24 @@ class VM(object):
                     tc = self.goals[-1]
                     deps = self.get_dependents_of(tc)
                     self.goals.pop()
+                    self.store(tc)
+                    self.forget(tc)
                     self.log(CompletedTask(tc, deps))
                     self.last_goal = tc
                 else:
+                    self.store(next_goal)
+                    self.forget(next_goal)
                     finished_last_goal = True
                 continue
+            except Exception as e:
+                error = self.retry(next_goal, e)
+                if error is not None:
+                    self.fail(next_goal, error)
+                made_progress = True
+                continue
 
+            if next_goal.task.retry is not None:
+                self.received.setdefault(next_goal, []).append(results)
 
             # We either need to fullfill new goals ...
             if self.is_new_requires(res):
@@ -276,12 +531,37 @@ class VM(object):
 
     def get_state(self, tc):
         if not tc in self.states:
-            state = tc.task.fun(*tc.args, **tc.kwargs._asdict())
-            assert isinstance(state, types.GeneratorType)
-            self.states[tc] = state
+            cache = tc.task.cache
+            if cache is not None:
+                hit, result = cache.get(tc)
+                if hit:
+                    self.cached.add(tc)
+                    self.states[tc] = _yield(result)
+                    return self.states[tc]
+            self.start(tc)
 
         return self.states[tc]
 
+    def start(self, tc):
+        state = tc.task.fun(*tc.args, **tc.kwargs._asdict())
+        assert isinstance(state, types.GeneratorType)
+        self.states[tc] = state
+        if tc.task.timeout is not None:
+            self.started[tc] = _clock()
+        return state
+
+    def store(self, tc):
+        """ Put the result of the completed task call into its cache. """
+        cache = tc.task.cache
+        if cache is not None and not tc in self.cached and tc in self.results:
+            cache.put(tc, self.results[tc])
+
+    def forget(self, tc):
+        """ Drop what we only needed while the task call was running. """
+        self.started.pop(tc, None)
+        self.received.pop(tc, None)
+        self.attempts.pop(tc, None)
+
     def get_requires(self, tc):
         if not tc in self.requires:
             self.requires[tc] = tuple()
@@ -301,9 +581,13 @@ class VM(object):
         # Make progress maybe
         made_progress = False
         for r in reversed(requires):
+            if self.is_failed(r):
+                # We won't get that, the task will be cancelled, which
+                # is progress as well.
+                made_progress = True
             # We already have that goal, but need to solve it
             # earlier now.
-            if r in self.goals:
+            elif r in self.goals:
                 self.goals.remove(r)
                 self.goals.append(r)
                 # But we surely made no progress, if we still need
@@ -323,6 +607,98 @@ class VM(object):
 
         return made_progress
 
+    def check_timeout(self, tc):
+        # Once the result is known and used, the task is in time. Results
+        # from a cache are known from the start, these have no start time.
+        timeout = tc.task.timeout
+        started = self.started.get(tc)
+        if (timeout is not None and started is not None
+                and not tc in self.results and _clock() - started > timeout):
+            raise TaskTimeoutError("%s did not finish within %s seconds"
+                                   % (tc.task.__name__, timeout))
+
+    def is_failed(self, tc):
+        return tc in self.failed and not tc in self.results
+
+    def retry(self, tc, error):
+        """
+        Start the task call again if its policy permits it. Returns the error
+        the task call finally failed with otherwise.
+        """
+        policy = tc.task.retry
+        while policy is not None:
+            attempt = self.attempts.get(tc, 1)
+            if not policy.retries(attempt, error):
+                break
+
+            delay = policy.delay(attempt)
+            deps = self.get_dependents_of(tc)
+            self.log(RetryTask(tc, deps, error, attempt, delay))
+            time.sleep(delay)
+            self.attempts[tc] = attempt + 1
+
+            try:
+                self.restart(tc)
+                return None
+            except Exception as e:
+                error = e
+
+        return error
+
+    def restart(self, tc):
+        self.states[tc].close()
+        del self.states[tc]
+
+        # Bring the new state to the point where the old one failed. What
+        # it yields is already known.
+        state = self.start(tc)
+        for results in self.received.get(tc, []):
+            state.send(results)
+
+    def fail(self, tc, error):
+        deps = self.get_dependency_chain(tc)
+        self.log(FailedTask(tc, deps, error))
+        self.stop(tc)
+        failure = TaskFailedError(tc, deps, error)
+
+        if self.keep_going:
+            self.failures.append(failure)
+            return
+
+        # Stop everything else that is still running, starting with the
+        # tasks that were started last.
+        for g in reversed(list(self.goals)):
+            self.cancel(g)
+        raise failure
+
+    def cancel(self, tc):
+        self.log(CancelledTask(tc, self.get_dependents_of(tc)))
+        self.stop(tc)
+
+    def stop(self, tc):
+        self.goals.remove(tc)
+        self.failed.add(tc)
+        self.forget(tc)
+        if tc in self.states:
+            # Give the task a chance to clean up.
+            self.states[tc].close()
+
+    def get_dependency_chain(self, tc):
+        """
+        Get the running task calls that require the task call, one requiring
+        the next, starting with the first goal.
+        """
+        chain = []
+        while True:
+            dependents = [g for g in reversed(self.goals)
+                          if tc in self.requires.get(g, ())
+                          and not g in chain]
+            if len(dependents) == 0:
+                break
+            tc = dependents[0]
+            chain.insert(0, tc)
+        return chain
+
     def get_dependents_of(self, tc):
         if self.goals[-1] == tc:
             return self.goals[0:-1]
@@ -346,3 +722,7 @@ class VM(object):
             else:
                 return tup
         return None
+
+def _yield(result):
+    """ Stands in for a task whose result is already known. """
+    yield result